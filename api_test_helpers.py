@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for the backend validation scripts
+Disk cache for expensive API responses so reruns skip paid calls,
+retry with backoff so a transient proxy error doesn't fail a whole run,
+and fast JSON decoding for the large base64-heavy responses
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import shelve
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+import httpx
+import orjson
+
+CACHE_DIR = Path(__file__).parent / ".test_cache"
+DEFAULT_TTL = 3600  # 1 hour
+VOICES_TTL = 3600  # Revalidated with If-None-Match once expired, so a short TTL is cheap
+
+# Gateway/rate-limit statuses worth retrying. Plain 500s are left out: the backend uses them
+# for deterministic failures (invalid API key, exhausted quota) that a retry would only pay for again
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+# Headers describing the transfer rather than the body; the cached body is stored already decoded
+_TRANSFER_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+def parse_json(response):
+    """Decode a response body with orjson, much faster than json on multi-MB base64 payloads"""
+    return orjson.loads(response.content)
+
+def classify_response(status_code, text):
+    """Bucket a backend response as "OK", "AUTH", "QUOTA", "FFMPEG" or "OTHER"
+
+    The backend wraps upstream failures in a 500, so the body text is what tells them apart.
+    """
+    if status_code == 401 or "invalid_api_key" in text:
+        return "AUTH"
+    lowered = text.lower()
+    if "quota" in lowered or "exceeded" in lowered:
+        return "QUOTA"
+    if "ffmpeg" in lowered:
+        return "FFMPEG"
+    return "OK" if status_code == 200 else "OTHER"
+
+@dataclass(slots=True)
+class CheckResult:
+    """Outcome of one logged check; slots keep the per-record footprint small"""
+    success: bool
+    details: str
+    duration: float | None
+    timestamp: str
+
+class ResponseCache:
+    """Successful responses persisted under .test_cache/, keyed by endpoint and payload"""
+
+    def __init__(self, enabled=True, path=CACHE_DIR / "responses"):
+        self.enabled = enabled
+        self.path = path
+        self._db = None
+
+    def _open(self):
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = shelve.open(str(self.path))
+        return self._db
+
+    @staticmethod
+    def key(method, endpoint, params=None, body=None):
+        """Hash a request; body is the already-serialized JSON payload, if any"""
+        raw = json.dumps({"method": method, "endpoint": endpoint, "params": params}, sort_keys=True)
+        return hashlib.sha256(raw.encode() + b"\0" + (body or b"")).hexdigest()
+
+    def get(self, key, allow_stale=False):
+        """Return the cached response for key, or None if missing or (unless allow_stale) expired"""
+        if not self.enabled:
+            return None
+        entry = self._open().get(key)
+        if entry is None or (entry["expires_at"] < time.time() and not allow_stale):
+            return None
+        return httpx.Response(entry["status"], headers=entry["headers"], content=entry["content"])
+
+    def set(self, key, response, ttl=DEFAULT_TTL):
+        if not self.enabled:
+            return
+        self._open()[key] = {
+            "expires_at": time.time() + ttl,
+            "status": response.status_code,
+            "headers": [(k, v) for k, v in response.headers.items() if k.lower() not in _TRANSFER_HEADERS],
+            "content": response.content
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+def _retry_after(response):
+    """Seconds requested by a Retry-After header, or None"""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+async def with_retry(send, *, attempts=4, base=0.5):
+    """Await send() again on transport errors and RETRY_STATUSES, with jittered exponential backoff"""
+    for attempt in range(attempts):
+        last_attempt = attempt == attempts - 1
+        delay = base * 2 ** attempt + random.uniform(0, 0.25)
+        try:
+            response = await send()
+        except (httpx.TransportError, asyncio.TimeoutError):
+            if last_attempt:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or last_attempt:
+                return response
+            delay = _retry_after(response) or delay
+        await asyncio.sleep(delay)
+
+async def cached_request(client, cache, method, endpoint, *, params=None, json=None, ttl=DEFAULT_TTL, **kwargs):
+    """Send a request through client unless cache holds a fresh response; only 200s are stored"""
+    # Serialize the payload once: the same bytes key the cache and go out as the request body
+    body = None
+    if json is not None:
+        body = orjson.dumps(json, option=orjson.OPT_SORT_KEYS)
+        kwargs["headers"] = {**kwargs.get("headers", {}), "Content-Type": "application/json"}
+
+    key = cache.key(method, endpoint, params, body)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    # An expired entry with an ETag is revalidated: a 304 renews it without resending the body
+    stale = cache.get(key, allow_stale=True)
+    if stale is not None and "etag" in stale.headers:
+        kwargs["headers"] = {**kwargs.get("headers", {}), "If-None-Match": stale.headers["etag"]}
+
+    response = await with_retry(
+        lambda: client.request(method, endpoint, params=params, content=body, **kwargs)
+    )
+    if response.status_code == 304 and stale is not None:
+        cache.set(key, stale, ttl)
+        return stale
+    if response.status_code == 200:
+        cache.set(key, response, ttl)
+    return response
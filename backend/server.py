@@ -1,6 +1,7 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
@@ -8,6 +9,8 @@ from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
+import hashlib
+import json
 from datetime import datetime
 import base64
 from openai import AsyncOpenAI
@@ -38,6 +41,8 @@ class VideoGenerationRequest(BaseModel):
     prompt: str
     duration: int = Field(default=30, ge=15, le=60)  # 15-60 seconds for TikTok
     voice_id: str = Field(default="pNInz6obpgDQGcFmaJgB")  # Default voice ID
+    script_id: Optional[str] = None  # Reuse an existing script instead of generating a new one
+    image_ids: Optional[List[str]] = None  # Reuse existing images instead of generating new ones
 
 class GeneratedScript(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -168,22 +173,20 @@ async def assemble_video(project_id: str, images: List[dict], audio_base64: str,
             temp_path = Path(temp_dir)
             
             # Save audio file
+            # Decoded buffers are written straight out rather than bound to locals,
+            # so they aren't held in memory for the whole FFmpeg run
             audio_path = temp_path / "audio.wav"
-            audio_data = base64.b64decode(audio_base64)
             with open(audio_path, "wb") as f:
-                f.write(audio_data)
+                f.write(base64.b64decode(audio_base64))
             
             # Save images
             image_paths = []
             for i, image in enumerate(images):
                 img_path = temp_path / f"image_{i}.png"
                 # Handle both dict and Pydantic object formats
-                if hasattr(image, 'image_base64'):
-                    img_data = base64.b64decode(image.image_base64)
-                else:
-                    img_data = base64.b64decode(image['image_base64'])
+                image_base64 = image.image_base64 if hasattr(image, 'image_base64') else image['image_base64']
                 with open(img_path, "wb") as f:
-                    f.write(img_data)
+                    f.write(base64.b64decode(image_base64))
                 image_paths.append(img_path)
             
             # Create subtitle file
@@ -272,10 +275,8 @@ async def assemble_video(project_id: str, images: List[dict], audio_base64: str,
             
             # Read the final video and convert to base64
             with open(output_path, 'rb') as f:
-                video_data = f.read()
-            
-            video_base64 = base64.b64encode(video_data).decode('utf-8')
-            logger.info(f"Video assembled successfully: {len(video_data)} bytes, {len(video_base64)} base64 chars")
+                video_base64 = base64.b64encode(f.read()).decode('utf-8')
+            logger.info(f"Video assembled successfully: {output_path.stat().st_size} bytes, {len(video_base64)} base64 chars")
             
             return video_base64
             
@@ -283,14 +284,20 @@ async def assemble_video(project_id: str, images: List[dict], audio_base64: str,
         logger.error(f"Error assembling video: {str(e)}")
         raise Exception(f"Video assembly failed: {str(e)}")
 
+def strip_base64(data: dict, field: str) -> dict:
+    """Replace a base64 payload with its length for metadata-only responses"""
+    data = dict(data)
+    data[f"{field}_length"] = len(data.pop(field))
+    return data
+
+# Shared by every ElevenLabs call so the connection to the API is kept alive between requests
+elevenlabs_httpx_client = httpx.AsyncClient(timeout=30.0)
+
 async def get_elevenlabs_client():
     """Get ElevenLabs client instance"""
-    import httpx
-    # Create custom httpx client with timeout
-    httpx_client = httpx.AsyncClient(timeout=30.0)
     return AsyncElevenLabs(
         api_key=ELEVENLABS_API_KEY,
-        httpx_client=httpx_client
+        httpx_client=elevenlabs_httpx_client
     )
 
 # Routes
@@ -298,6 +305,11 @@ async def get_elevenlabs_client():
 async def root():
     return {"message": "TikTok Video Generator API"}
 
+@api_router.api_route("/healthz", methods=["GET", "HEAD"])
+async def healthz():
+    """Liveness probe; HEAD requests get the status without a body"""
+    return {"ok": 1}
+
 @api_router.post("/generate-script", response_model=GeneratedScript)
 async def generate_script(request: VideoGenerationRequest):
     try:
@@ -375,8 +387,11 @@ async def generate_script(request: VideoGenerationRequest):
         raise HTTPException(status_code=500, detail=f"Error generating script: {str(e)}")
 
 @api_router.post("/generate-voice")
-async def generate_voice(script_id: str, voice_id: str = "pNInz6obpgDQGcFmaJgB"):
-    """Generate voice narration from script using ElevenLabs"""
+async def generate_voice(script_id: str, voice_id: str = "pNInz6obpgDQGcFmaJgB", include: str = "all"):
+    """Generate voice narration from script using ElevenLabs
+
+    With include=metadata the audio base64 payload is replaced by its length.
+    """
     try:
         # Get script from database
         script_data = await db.scripts.find_one({"id": script_id})
@@ -395,9 +410,10 @@ async def generate_voice(script_id: str, voice_id: str = "pNInz6obpgDQGcFmaJgB")
         # Validate voice exists by checking available voices
         try:
             voices = await client.voices.get_all()
-            voice_names = {voice.voice_id: voice.name for voice in voices.voices}
-            if selected_voice_id in voice_names:
-                logger.info(f"Voice validated: {voice_names[selected_voice_id]} ({selected_voice_id})")
+            # Single pass that stops at the match instead of building an id -> name dict per request
+            voice_name = next((voice.name for voice in voices.voices if voice.voice_id == selected_voice_id), None)
+            if voice_name is not None:
+                logger.info(f"Voice validated: {voice_name} ({selected_voice_id})")
             else:
                 logger.warning(f"Voice ID {selected_voice_id} not found, using default")
                 selected_voice_id = "pNInz6obpgDQGcFmaJgB"  # Default fallback
@@ -447,7 +463,7 @@ async def generate_voice(script_id: str, voice_id: str = "pNInz6obpgDQGcFmaJgB")
             # Save to database
             await db.audio.insert_one(audio_obj.dict())
             
-            return {
+            result = {
                 "audio_id": audio_obj.id,
                 "script_id": script_id,
                 "voice_id": selected_voice_id,
@@ -455,6 +471,9 @@ async def generate_voice(script_id: str, voice_id: str = "pNInz6obpgDQGcFmaJgB")
                 "audio_base64": audio_base64,
                 "message": "ElevenLabs audio generated successfully"
             }
+            if include == "metadata":
+                result = strip_base64(result, "audio_base64")
+            return result
             
         except Exception as tts_error:
             logger.error(f"Error generating TTS: {str(tts_error)}")
@@ -465,8 +484,11 @@ async def generate_voice(script_id: str, voice_id: str = "pNInz6obpgDQGcFmaJgB")
         raise HTTPException(status_code=500, detail=f"Error generating voice: {str(e)}")
 
 @api_router.get("/voices/available")
-async def get_available_voices():
-    """Get all available voices from ElevenLabs"""
+async def get_available_voices(request: Request):
+    """Get all available voices from ElevenLabs
+
+    The response carries an ETag; a matching If-None-Match gets an empty 304 instead of the list.
+    """
     try:
         client = await get_elevenlabs_client()
         voices = await client.voices.get_all()
@@ -481,14 +503,22 @@ async def get_available_voices():
                 "preview_url": getattr(voice, 'preview_url', '')
             })
         
-        return {"voices": voice_list}
+        body = json.dumps({"voices": voice_list}, separators=(",", ":")).encode()
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(body, media_type="application/json", headers={"ETag": etag})
         
     except Exception as e:
         logger.error(f"Error fetching voices: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching voices: {str(e)}")
 
 @api_router.post("/generate-images")
-async def generate_images(script_id: str):
+async def generate_images(script_id: str, include: str = "all"):
+    """Generate one charcoal-style image per scene of a script
+
+    With include=metadata each image's base64 payload is replaced by its length.
+    """
     try:
         # Get script from database
         script_data = await db.scripts.find_one({"id": script_id})
@@ -543,9 +573,13 @@ async def generate_images(script_id: str):
                 # Continue with other scenes even if one fails
                 continue
         
+        images = generated_images
+        if include == "metadata":
+            images = [strip_base64(img.dict(), "image_base64") for img in generated_images]
+        
         return {
             "script_id": script_id,
-            "images": generated_images,
+            "images": images,
             "total_generated": len(generated_images)
         }
 
@@ -553,6 +587,16 @@ async def generate_images(script_id: str):
         logger.error(f"Error generating images: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating images: {str(e)}")
 
+@api_router.post("/generate-script-and-images")
+async def generate_script_and_images(request: VideoGenerationRequest, include: str = "all"):
+    """Generate a script and its images in a single request
+
+    Spares callers the extra round trip of passing the new script_id back to /generate-images.
+    """
+    script_response = await generate_script(request)
+    images_response = await generate_images(script_response.id, include)
+    return {"script": script_response, **images_response}
+
 @api_router.post("/assemble-video")
 async def assemble_final_video(project_id: str):
     """Assemble final video with images, voice, and subtitles"""
@@ -620,21 +664,39 @@ async def assemble_final_video(project_id: str):
         raise HTTPException(status_code=500, detail=f"Error assembling video: {str(e)}")
 
 @api_router.post("/create-complete-video", response_model=dict)
-async def create_complete_video(request: VideoGenerationRequest):
-    """Complete pipeline: script -> images -> voice -> video assembly"""
+async def create_complete_video(request: VideoGenerationRequest, include: str = "all"):
+    """Complete pipeline: script -> images -> voice -> video assembly
+
+    With include=metadata the image and video base64 payloads are replaced by their
+    lengths, for callers that only need to check the pipeline ran.
+    """
     try:
         logger.info(f"Starting complete video generation for prompt: {request.prompt[:50]}...")
         
-        # Step 1: Generate script
-        logger.info("Step 1: Generating script...")
-        script_response = await generate_script(request)
+        # Step 1: Generate script, or reuse the one the caller already paid for
+        if request.script_id:
+            logger.info(f"Step 1: Reusing script {request.script_id}...")
+            script_data = await db.scripts.find_one({"id": request.script_id})
+            if not script_data:
+                raise HTTPException(status_code=404, detail="Script not found")
+            script_response = GeneratedScript(**script_data)
+        else:
+            logger.info("Step 1: Generating script...")
+            script_response = await generate_script(request)
         script_id = script_response.id
-        logger.info(f"Script generated successfully: {script_id}")
-        
-        # Step 2: Generate images
-        logger.info("Step 2: Generating images...")
-        images_response = await generate_images(script_id)
-        logger.info(f"Images generated successfully: {len(images_response['images'])} images")
+        logger.info(f"Script ready: {script_id}")
+        
+        # Step 2: Generate images, or reuse the ones the caller already paid for
+        if request.image_ids:
+            logger.info(f"Step 2: Reusing {len(request.image_ids)} images...")
+            images_data = await db.images.find({"id": {"$in": request.image_ids}}).to_list(1000)
+            if not images_data:
+                raise HTTPException(status_code=404, detail="Images not found")
+            images_response = {"images": [GeneratedImage(**img) for img in images_data]}
+        else:
+            logger.info("Step 2: Generating images...")
+            images_response = await generate_images(script_id)
+        logger.info(f"Images ready: {len(images_response['images'])} images")
         
         # Step 3: Generate voice
         logger.info(f"Step 3: Generating voice with voice_id: {request.voice_id}...")
@@ -659,21 +721,27 @@ async def create_complete_video(request: VideoGenerationRequest):
         video_response = await assemble_final_video(project_obj.id)
         logger.info(f"Video assembled successfully: {video_response['video_id']}")
         
+        images = images_response["images"]
+        video = {
+            "video_id": video_response["video_id"],
+            "duration": video_response["duration"],
+            "resolution": video_response["resolution"],
+            "video_base64": video_response["video_base64"]
+        }
+        if include == "metadata":
+            images = [strip_base64(img.dict(), "image_base64") for img in images]
+            video = strip_base64(video, "video_base64")
+        
         return {
             "project_id": project_obj.id,
             "script": script_response,
-            "images": images_response["images"],
+            "images": images,
             "audio": {
                 "audio_id": voice_response["audio_id"],
                 "duration": voice_response["duration"],
                 "voice_id": voice_response["voice_id"]
             },
-            "video": {
-                "video_id": video_response["video_id"],
-                "duration": video_response["duration"],
-                "resolution": video_response["resolution"],
-                "video_base64": video_response["video_base64"]
-            },
+            "video": video,
             "status": "completed"
         }
         
@@ -716,7 +784,11 @@ async def create_video_project(request: VideoGenerationRequest):
         raise HTTPException(status_code=500, detail=f"Error creating video project: {str(e)}")
 
 @api_router.get("/project/{project_id}")
-async def get_project(project_id: str):
+async def get_project(project_id: str, include: str = "all"):
+    """Get a project with its script and images
+
+    With include=metadata each image's base64 payload is replaced by its length.
+    """
     try:
         # Get project
         project_data = await db.projects.find_one({"id": project_id})
@@ -749,6 +821,8 @@ async def get_project(project_id: str):
             script_data = convert_objectid(script_data)
         for img in images_data:
             convert_objectid(img)
+        if include == "metadata":
+            images_data = [strip_base64(img, "image_base64") for img in images_data]
         
         return {
             "project": project_data,
@@ -771,8 +845,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# The base64 image/audio/video payloads shrink by roughly a quarter under gzip
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+    await elevenlabs_httpx_client.aclose()
\ No newline at end of file
@@ -5,46 +5,66 @@ Tests all API endpoints with real API keys provided by user
 """
 
 import asyncio
-import aiohttp
-import json
+import httpx
+import sys
 import base64
 import time
 from datetime import datetime
 
+import orjson
+
+from api_test_helpers import CACHE_DIR, CheckResult, ResponseCache, cached_request, parse_json, with_retry, VOICES_TTL
+
 # Backend URL from frontend environment
 BACKEND_URL = "https://prompt-to-video-18.preview.emergentagent.com/api"
 
+# Fields each response must carry, checked with a single set difference
+SCRIPT_FIELDS = frozenset(("id", "prompt", "duration", "script_text", "scenes", "created_at"))
+IMAGES_FIELDS = frozenset(("images", "total_generated"))
+VOICE_FIELDS = frozenset(("audio_id", "script_id", "voice_id", "duration", "audio_base64_length"))
+PIPELINE_SECTIONS = frozenset(("project_id", "script", "images", "audio", "video", "status"))
+PROJECT_SECTIONS = frozenset(("project", "script", "images"))
+
 class TikTokBackendTester:
     def __init__(self):
         self.session = None
+        # Separate file from the other scripts' cache: run_all.py runs this script alongside them
+        self.cache = ResponseCache(path=CACHE_DIR / "backend_test")
         self.test_results = {}
         self.script_id = None
+        self.image_ids = None
         self.project_id = None
         
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=120)  # 2 minute timeout for video generation
+        # HTTP/2 multiplexes the concurrent test lanes over one TLS connection
+        self.session = httpx.AsyncClient(
+            base_url=BACKEND_URL,
+            http2=True,
+            timeout=120.0,  # 2 minute timeout for video generation
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=16)
         )
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         if self.session:
-            await self.session.close()
+            await self.session.aclose()
+        self.cache.close()
+    
+    async def get_voices(self):
+        """GET /voices/available, revalidated with If-None-Match rather than refetched every run"""
+        return await cached_request(self.session, self.cache, "GET", "/voices/available", ttl=VOICES_TTL)
     
     def log_test(self, test_name, success, details, duration=None):
         """Log test results"""
         status = "✅ PASS" if success else "❌ FAIL"
         duration_str = f" ({duration:.2f}s)" if duration else ""
-        print(f"{status}: {test_name}{duration_str}")
+        # One write per check: a single flush on a line-buffered terminal instead of one per line
+        lines = f"{status}: {test_name}{duration_str}\n"
         if details:
-            print(f"   Details: {details}")
+            lines += f"   Details: {details}\n"
+        sys.stdout.write(lines)
         
-        self.test_results[test_name] = {
-            "success": success,
-            "details": details,
-            "duration": duration,
-            "timestamp": datetime.now().isoformat()
-        }
+        self.test_results[test_name] = CheckResult(success, details, duration, datetime.now().isoformat())
     
     async def test_health_check(self):
         """Test GET /api/ - Health check"""
@@ -52,21 +72,21 @@ class TikTokBackendTester:
         start_time = time.time()
         
         try:
-            async with self.session.get(f"{BACKEND_URL}/") as response:
-                duration = time.time() - start_time
-                
-                if response.status == 200:
-                    data = await response.json()
-                    if "message" in data:
-                        self.log_test(test_name, True, f"Status: {response.status}, Message: {data['message']}", duration)
-                        return True
-                    else:
-                        self.log_test(test_name, False, f"Status: {response.status}, Missing message field", duration)
-                        return False
+            response = await with_retry(lambda: self.session.get("/"))
+            duration = time.time() - start_time
+            
+            if response.status_code == 200:
+                data = parse_json(response)
+                if "message" in data:
+                    self.log_test(test_name, True, f"Status: {response.status_code}, Message: {data['message']}", duration)
+                    return True
                 else:
-                    self.log_test(test_name, False, f"Status: {response.status}", duration)
+                    self.log_test(test_name, False, f"Status: {response.status_code}, Missing message field", duration)
                     return False
-                    
+            else:
+                self.log_test(test_name, False, f"Status: {response.status_code}", duration)
+                return False
+                
         except Exception as e:
             duration = time.time() - start_time
             self.log_test(test_name, False, f"Exception: {str(e)}", duration)
@@ -78,24 +98,24 @@ class TikTokBackendTester:
         start_time = time.time()
         
         try:
-            async with self.session.get(f"{BACKEND_URL}/voices/available") as response:
-                duration = time.time() - start_time
-                
-                if response.status == 200:
-                    data = await response.json()
-                    if "voices" in data and isinstance(data["voices"], list):
-                        voice_count = len(data["voices"])
-                        sample_voices = [v["name"] for v in data["voices"][:3]]
-                        self.log_test(test_name, True, f"Retrieved {voice_count} voices. Sample: {sample_voices}", duration)
-                        return True
-                    else:
-                        self.log_test(test_name, False, f"Status: {response.status}, Invalid response format", duration)
-                        return False
+            response = await self.get_voices()
+            duration = time.time() - start_time
+            
+            if response.status_code == 200:
+                data = parse_json(response)
+                if "voices" in data and isinstance(data["voices"], list):
+                    voice_count = len(data["voices"])
+                    sample_voices = [v["name"] for v in data["voices"][:3]]
+                    self.log_test(test_name, True, f"Retrieved {voice_count} voices. Sample: {sample_voices}", duration)
+                    return True
                 else:
-                    error_text = await response.text()
-                    self.log_test(test_name, False, f"Status: {response.status}, Error: {error_text}", duration)
+                    self.log_test(test_name, False, f"Status: {response.status_code}, Invalid response format", duration)
                     return False
-                    
+            else:
+                error_text = response.text
+                self.log_test(test_name, False, f"Status: {response.status_code}, Error: {error_text}", duration)
+                return False
+                
         except Exception as e:
             duration = time.time() - start_time
             self.log_test(test_name, False, f"Exception: {str(e)}", duration)
@@ -112,32 +132,33 @@ class TikTokBackendTester:
                 "duration": 30
             }
             
-            async with self.session.post(
-                f"{BACKEND_URL}/generate-script",
-                json=payload,
-                headers={"Content-Type": "application/json"}
-            ) as response:
-                duration = time.time() - start_time
+            response = await with_retry(
+                lambda: self.session.post(
+                    "/generate-script",
+                    json=payload,
+                    headers={"Content-Type": "application/json"}
+                )
+            )
+            duration = time.time() - start_time
+            
+            if response.status_code == 200:
+                data = parse_json(response)
+                missing_fields = sorted(SCRIPT_FIELDS - data.keys())
                 
-                if response.status == 200:
-                    data = await response.json()
-                    required_fields = ["id", "prompt", "duration", "script_text", "scenes", "created_at"]
-                    
-                    if all(field in data for field in required_fields):
-                        self.script_id = data["id"]  # Store for later tests
-                        script_length = len(data["script_text"])
-                        scene_count = len(data["scenes"])
-                        self.log_test(test_name, True, f"Script generated: {script_length} chars, {scene_count} scenes, ID: {self.script_id}", duration)
-                        return True
-                    else:
-                        missing_fields = [f for f in required_fields if f not in data]
-                        self.log_test(test_name, False, f"Status: {response.status}, Missing fields: {missing_fields}", duration)
-                        return False
+                if not missing_fields:
+                    self.script_id = data["id"]  # Store for later tests
+                    script_length = len(data["script_text"])
+                    scene_count = len(data["scenes"])
+                    self.log_test(test_name, True, f"Script generated: {script_length} chars, {scene_count} scenes, ID: {self.script_id}", duration)
+                    return True
                 else:
-                    error_text = await response.text()
-                    self.log_test(test_name, False, f"Status: {response.status}, Error: {error_text}", duration)
+                    self.log_test(test_name, False, f"Status: {response.status_code}, Missing fields: {missing_fields}", duration)
                     return False
-                    
+            else:
+                error_text = response.text
+                self.log_test(test_name, False, f"Status: {response.status_code}, Error: {error_text}", duration)
+                return False
+                
         except Exception as e:
             duration = time.time() - start_time
             self.log_test(test_name, False, f"Exception: {str(e)}", duration)
@@ -153,38 +174,43 @@ class TikTokBackendTester:
             return False
         
         try:
-            async with self.session.post(
-                f"{BACKEND_URL}/generate-images?script_id={self.script_id}",
-                headers={"Content-Type": "application/json"}
-            ) as response:
-                duration = time.time() - start_time
+            response = await with_retry(
+                lambda: self.session.post(
+                    "/generate-images",
+                    # Only sizes are checked, so skip downloading the base64 payloads
+                    params={"script_id": self.script_id, "include": "metadata"},
+                    headers={"Content-Type": "application/json"}
+                )
+            )
+            duration = time.time() - start_time
+            
+            if response.status_code == 200:
+                data = parse_json(response)
+                missing_fields = sorted(IMAGES_FIELDS - data.keys())
                 
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    if "images" in data and "total_generated" in data:
-                        image_count = data["total_generated"]
-                        if image_count > 0 and len(data["images"]) > 0:
-                            # Check first image for valid base64 data
-                            first_image = data["images"][0]
-                            if "image_base64" in first_image and len(first_image["image_base64"]) > 1000:
-                                base64_length = len(first_image["image_base64"])
-                                self.log_test(test_name, True, f"Generated {image_count} images, first image: {base64_length} chars base64", duration)
-                                return True
-                            else:
-                                self.log_test(test_name, False, f"Generated {image_count} images but invalid base64 data", duration)
-                                return False
+                if not missing_fields:
+                    image_count = data["total_generated"]
+                    if image_count > 0 and len(data["images"]) > 0:
+                        # Check first image for valid base64 data
+                        base64_length = data["images"][0].get("image_base64_length", 0)
+                        if base64_length > 1000:
+                            self.image_ids = [img["id"] for img in data["images"]]  # Reused by the pipeline test
+                            self.log_test(test_name, True, f"Generated {image_count} images, first image: {base64_length} chars base64", duration)
+                            return True
                         else:
-                            self.log_test(test_name, False, f"No images generated (total: {image_count})", duration)
+                            self.log_test(test_name, False, f"Generated {image_count} images but invalid base64 data", duration)
                             return False
                     else:
-                        self.log_test(test_name, False, f"Status: {response.status}, Invalid response format", duration)
+                        self.log_test(test_name, False, f"No images generated (total: {image_count})", duration)
                         return False
                 else:
-                    error_text = await response.text()
-                    self.log_test(test_name, False, f"Status: {response.status}, Error: {error_text}", duration)
+                    self.log_test(test_name, False, f"Status: {response.status_code}, Missing fields: {missing_fields}", duration)
                     return False
-                    
+            else:
+                error_text = response.text
+                self.log_test(test_name, False, f"Status: {response.status_code}, Error: {error_text}", duration)
+                return False
+                
         except Exception as e:
             duration = time.time() - start_time
             self.log_test(test_name, False, f"Exception: {str(e)}", duration)
@@ -202,41 +228,43 @@ class TikTokBackendTester:
         # Get first available voice ID
         first_voice_id = "pNInz6obpgDQGcFmaJgB"  # Default fallback
         try:
-            async with self.session.get(f"{BACKEND_URL}/voices/available") as response:
-                if response.status == 200:
-                    voices_data = await response.json()
-                    if "voices" in voices_data and len(voices_data["voices"]) > 0:
-                        first_voice_id = voices_data["voices"][0]["voice_id"]
-                        print(f"   Using first available voice: {voices_data['voices'][0]['name']} ({first_voice_id})")
+            response = await self.get_voices()
+            if response.status_code == 200:
+                voices_data = parse_json(response)
+                if "voices" in voices_data and len(voices_data["voices"]) > 0:
+                    first_voice_id = voices_data["voices"][0]["voice_id"]
+                    print(f"   Using first available voice: {voices_data['voices'][0]['name']} ({first_voice_id})")
         except Exception as e:
             print(f"   Warning: Could not fetch voices, using default: {e}")
         
         try:
-            async with self.session.post(
-                f"{BACKEND_URL}/generate-voice?script_id={self.script_id}&voice_id={first_voice_id}",
-                headers={"Content-Type": "application/json"}
-            ) as response:
-                duration = time.time() - start_time
+            response = await with_retry(
+                lambda: self.session.post(
+                    "/generate-voice",
+                    params={"script_id": self.script_id, "voice_id": first_voice_id, "include": "metadata"},
+                    headers={"Content-Type": "application/json"}
+                )
+            )
+            duration = time.time() - start_time
+            
+            if response.status_code == 200:
+                data = parse_json(response)
+                missing_fields = sorted(VOICE_FIELDS - data.keys())
                 
-                if response.status == 200:
-                    data = await response.json()
-                    required_fields = ["audio_id", "script_id", "voice_id", "duration", "audio_base64"]
-                    
-                    if all(field in data for field in required_fields):
-                        audio_duration = data["duration"]
-                        audio_base64_length = len(data["audio_base64"])
-                        voice_id = data["voice_id"]
-                        self.log_test(test_name, True, f"Voice generated: {audio_duration:.1f}s duration, {audio_base64_length} chars base64, voice: {voice_id}", duration)
-                        return True
-                    else:
-                        missing_fields = [f for f in required_fields if f not in data]
-                        self.log_test(test_name, False, f"Status: {response.status}, Missing fields: {missing_fields}", duration)
-                        return False
+                if not missing_fields:
+                    audio_duration = data["duration"]
+                    audio_base64_length = data["audio_base64_length"]
+                    voice_id = data["voice_id"]
+                    self.log_test(test_name, True, f"Voice generated: {audio_duration:.1f}s duration, {audio_base64_length} chars base64, voice: {voice_id}", duration)
+                    return True
                 else:
-                    error_text = await response.text()
-                    self.log_test(test_name, False, f"Status: {response.status}, Error: {error_text}", duration)
+                    self.log_test(test_name, False, f"Status: {response.status_code}, Missing fields: {missing_fields}", duration)
                     return False
-                    
+            else:
+                error_text = response.text
+                self.log_test(test_name, False, f"Status: {response.status_code}, Error: {error_text}", duration)
+                return False
+                
         except Exception as e:
             duration = time.time() - start_time
             self.log_test(test_name, False, f"Exception: {str(e)}", duration)
@@ -247,15 +275,20 @@ class TikTokBackendTester:
         test_name = "Complete Video Pipeline (POST /api/create-complete-video)"
         start_time = time.time()
         
+        # The pipeline opens with the same GPT-4 call; fail now rather than minutes into a doomed run
+        if not self.script_id:
+            self.log_test(test_name, False, "Skipped: script generation failed in the previous test", 0)
+            return False
+        
         # Get first available voice ID for the test
         first_voice_id = "pNInz6obpgDQGcFmaJgB"  # Default fallback
         try:
-            async with self.session.get(f"{BACKEND_URL}/voices/available") as response:
-                if response.status == 200:
-                    voices_data = await response.json()
-                    if "voices" in voices_data and len(voices_data["voices"]) > 0:
-                        first_voice_id = voices_data["voices"][0]["voice_id"]
-                        print(f"   Using first available voice for complete pipeline: {voices_data['voices'][0]['name']} ({first_voice_id})")
+            response = await self.get_voices()
+            if response.status_code == 200:
+                voices_data = parse_json(response)
+                if "voices" in voices_data and len(voices_data["voices"]) > 0:
+                    first_voice_id = voices_data["voices"][0]["voice_id"]
+                    print(f"   Using first available voice for complete pipeline: {voices_data['voices'][0]['name']} ({first_voice_id})")
         except Exception as e:
             print(f"   Warning: Could not fetch voices for pipeline, using default: {e}")
         
@@ -265,41 +298,47 @@ class TikTokBackendTester:
                 "duration": 30,
                 "voice_id": first_voice_id
             }
+            # Reuse the script and images from the component tests instead of paying for them twice
+            if self.script_id and self.image_ids:
+                payload["script_id"] = self.script_id
+                payload["image_ids"] = self.image_ids
             
-            async with self.session.post(
-                f"{BACKEND_URL}/create-complete-video",
-                json=payload,
-                headers={"Content-Type": "application/json"}
-            ) as response:
-                duration = time.time() - start_time
+            response = await with_retry(
+                lambda: self.session.post(
+                    "/create-complete-video",
+                    params={"include": "metadata"},
+                    json=payload,
+                    headers={"Content-Type": "application/json"}
+                )
+            )
+            duration = time.time() - start_time
+            
+            if response.status_code == 200:
+                data = parse_json(response)
+                missing_sections = sorted(PIPELINE_SECTIONS - data.keys())
                 
-                if response.status == 200:
-                    data = await response.json()
-                    required_sections = ["project_id", "script", "images", "audio", "video", "status"]
+                if not missing_sections:
+                    project_id = data["project_id"]
+                    script_length = len(data["script"]["script_text"])
+                    image_count = len(data["images"])
+                    audio_duration = data["audio"]["duration"]
+                    audio_voice_id = data["audio"]["voice_id"]
+                    video_base64_length = data["video"]["video_base64_length"]
+                    video_resolution = data["video"]["resolution"]
                     
-                    if all(section in data for section in required_sections):
-                        project_id = data["project_id"]
-                        script_length = len(data["script"]["script_text"])
-                        image_count = len(data["images"])
-                        audio_duration = data["audio"]["duration"]
-                        audio_voice_id = data["audio"]["voice_id"]
-                        video_base64_length = len(data["video"]["video_base64"])
-                        video_resolution = data["video"]["resolution"]
-                        
-                        self.log_test(test_name, True, f"Complete pipeline success: Project {project_id}, Script {script_length} chars, {image_count} images, Audio {audio_duration:.1f}s (voice: {audio_voice_id}), Video {video_base64_length} chars ({video_resolution})", duration)
-                        
-                        # Store project_id for retrieval test
-                        self.project_id = project_id
-                        return True
-                    else:
-                        missing_sections = [s for s in required_sections if s not in data]
-                        self.log_test(test_name, False, f"Status: {response.status}, Missing sections: {missing_sections}", duration)
-                        return False
+                    self.log_test(test_name, True, f"Complete pipeline success: Project {project_id}, Script {script_length} chars, {image_count} images, Audio {audio_duration:.1f}s (voice: {audio_voice_id}), Video {video_base64_length} chars ({video_resolution})", duration)
+                    
+                    # Store project_id for retrieval test
+                    self.project_id = project_id
+                    return True
                 else:
-                    error_text = await response.text()
-                    self.log_test(test_name, False, f"Status: {response.status}, Error: {error_text}", duration)
+                    self.log_test(test_name, False, f"Status: {response.status_code}, Missing sections: {missing_sections}", duration)
                     return False
-                    
+            else:
+                error_text = response.text
+                self.log_test(test_name, False, f"Status: {response.status_code}, Error: {error_text}", duration)
+                return False
+                
         except Exception as e:
             duration = time.time() - start_time
             self.log_test(test_name, False, f"Exception: {str(e)}", duration)
@@ -315,66 +354,74 @@ class TikTokBackendTester:
             return False
         
         try:
-            async with self.session.get(f"{BACKEND_URL}/project/{self.project_id}") as response:
-                duration = time.time() - start_time
+            response = await with_retry(lambda: self.session.get(f"/project/{self.project_id}", params={"include": "metadata"}))
+            duration = time.time() - start_time
+            
+            if response.status_code == 200:
+                data = parse_json(response)
+                missing_sections = sorted(PROJECT_SECTIONS - data.keys())
                 
-                if response.status == 200:
-                    data = await response.json()
-                    required_sections = ["project", "script", "images"]
+                if not missing_sections:
+                    project_data = data["project"]
+                    script_data = data["script"]
+                    images_data = data["images"]
                     
-                    if all(section in data for section in required_sections):
-                        project_data = data["project"]
-                        script_data = data["script"]
-                        images_data = data["images"]
-                        
-                        project_status = project_data.get("status", "unknown")
-                        script_length = len(script_data.get("script_text", "")) if script_data else 0
-                        image_count = len(images_data) if images_data else 0
-                        
-                        self.log_test(test_name, True, f"Project retrieved: Status {project_status}, Script {script_length} chars, {image_count} images", duration)
-                        return True
-                    else:
-                        missing_sections = [s for s in required_sections if s not in data]
-                        self.log_test(test_name, False, f"Status: {response.status}, Missing sections: {missing_sections}", duration)
-                        return False
+                    project_status = project_data.get("status", "unknown")
+                    script_length = len(script_data.get("script_text", "")) if script_data else 0
+                    image_count = len(images_data) if images_data else 0
+                    
+                    self.log_test(test_name, True, f"Project retrieved: Status {project_status}, Script {script_length} chars, {image_count} images", duration)
+                    return True
                 else:
-                    error_text = await response.text()
-                    self.log_test(test_name, False, f"Status: {response.status}, Error: {error_text}", duration)
+                    self.log_test(test_name, False, f"Status: {response.status_code}, Missing sections: {missing_sections}", duration)
                     return False
-                    
+            else:
+                error_text = response.text
+                self.log_test(test_name, False, f"Status: {response.status_code}, Error: {error_text}", duration)
+                return False
+                
         except Exception as e:
             duration = time.time() - start_time
             self.log_test(test_name, False, f"Exception: {str(e)}", duration)
             return False
     
+    async def run_generation_chain(self):
+        """Script, then images; voice generation and the pipeline (reusing both) then run side by side"""
+        script_ok = await self.test_generate_script()
+        images_ok = await self.test_generate_images()
+        voice_ok, pipeline_results = await asyncio.gather(self.test_generate_voice(), self.run_pipeline_chain())
+        return [script_ok, images_ok, voice_ok, *pipeline_results]
+    
+    async def run_pipeline_chain(self):
+        """Complete pipeline, then retrieval of the project it created"""
+        pipeline_ok = await self.test_complete_video_pipeline()
+        return [pipeline_ok, await self.test_project_retrieval()]
+    
     async def run_all_tests(self):
-        """Run all backend tests in sequence"""
+        """Run all backend tests, concurrently wherever they don't depend on each other"""
         print("🚀 Starting TikTok Video Generator Backend Testing")
         print(f"Backend URL: {BACKEND_URL}")
         print("=" * 80)
         
-        # Test sequence
-        tests = [
-            ("Health Check", self.test_health_check),
-            ("Available Voices", self.test_available_voices),
-            ("Script Generation", self.test_generate_script),
-            ("Image Generation", self.test_generate_images),
-            ("Voice Generation", self.test_generate_voice),
-            ("Complete Pipeline", self.test_complete_video_pipeline),
-            ("Project Retrieval", self.test_project_retrieval)
-        ]
+        # Health, voices and the generation chain are independent;
+        # the client's connection limits cap how many requests are in flight
+        print("\n🧪 Running: Health Check, Available Voices, Script/Image/Voice Generation, Complete Pipeline, Project Retrieval")
+        total = 7
+        results = await asyncio.gather(
+            self.test_health_check(),
+            self.test_available_voices(),
+            self.run_generation_chain(),
+            return_exceptions=True
+        )
         
         passed = 0
-        total = len(tests)
-        
-        for test_name, test_func in tests:
-            print(f"\n🧪 Running: {test_name}")
-            try:
-                success = await test_func()
-                if success:
-                    passed += 1
-            except Exception as e:
-                print(f"❌ FAIL: {test_name} - Unexpected error: {str(e)}")
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"❌ FAIL: Unexpected error: {str(result)}")
+            elif isinstance(result, list):
+                passed += sum(result)
+            elif result:
+                passed += 1
         
         print("\n" + "=" * 80)
         print(f"📊 TEST SUMMARY: {passed}/{total} tests passed")
@@ -394,8 +441,9 @@ async def main():
         passed, total, results = await tester.run_all_tests()
         
         # Save detailed results
-        with open("/app/backend_test_results.json", "w") as f:
-            json.dump({
+        # orjson serializes the CheckResult dataclasses directly, no asdict() copies
+        with open("/app/backend_test_results.json", "wb") as f:
+            f.write(orjson.dumps({
                 "summary": {
                     "passed": passed,
                     "total": total,
@@ -403,7 +451,7 @@ async def main():
                     "timestamp": datetime.now().isoformat()
                 },
                 "detailed_results": results
-            }, f, indent=2)
+            }, option=orjson.OPT_INDENT_2))
         
         print(f"\n📄 Detailed results saved to: /app/backend_test_results.json")
         return passed == total
@@ -5,11 +5,15 @@ Tests working components and identifies API key issues
 """
 
 import asyncio
-import aiohttp
-import json
+import httpx
+import sys
 import time
 from datetime import datetime
 
+import orjson
+
+from api_test_helpers import CheckResult, classify_response, parse_json, with_retry
+
 # Backend URL from frontend environment
 BACKEND_URL = "https://prompt-to-video-18.preview.emergentagent.com/api"
 
@@ -17,31 +21,40 @@ class FocusedTikTokTester:
     def __init__(self):
         self.session = None
         self.test_results = {}
+        self._passed = 0
+        self._auth_failures = []
         
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=60)
+        # HTTP/2 multiplexes the concurrently gathered tests over one TLS connection
+        self.session = httpx.AsyncClient(
+            base_url=BACKEND_URL,
+            http2=True,
+            timeout=60.0,
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=16)
         )
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         if self.session:
-            await self.session.close()
+            await self.session.aclose()
     
     def log_test(self, test_name, success, details, duration=None):
         """Log test results"""
         status = "✅ PASS" if success else "❌ FAIL"
         duration_str = f" ({duration:.2f}s)" if duration else ""
-        print(f"{status}: {test_name}{duration_str}")
+        # One write per check: a single flush on a line-buffered terminal instead of one per line
+        lines = f"{status}: {test_name}{duration_str}\n"
         if details:
-            print(f"   Details: {details}")
+            lines += f"   Details: {details}\n"
+        sys.stdout.write(lines)
+        
+        # Tally as we go so the summary needs no extra pass over test_results
+        if success:
+            self._passed += 1
+        elif "401" in details:
+            self._auth_failures.append((test_name, details))
         
-        self.test_results[test_name] = {
-            "success": success,
-            "details": details,
-            "duration": duration,
-            "timestamp": datetime.now().isoformat()
-        }
+        self.test_results[test_name] = CheckResult(success, details, duration, datetime.now().isoformat())
     
     async def test_api_health(self):
         """Test API health and accessibility"""
@@ -49,17 +62,17 @@ class FocusedTikTokTester:
         start_time = time.time()
         
         try:
-            async with self.session.get(f"{BACKEND_URL}/") as response:
-                duration = time.time() - start_time
+            response = await with_retry(lambda: self.session.get("/"))
+            duration = time.time() - start_time
+            
+            if response.status_code == 200:
+                data = parse_json(response)
+                self.log_test(test_name, True, f"Backend accessible: {data.get('message', 'OK')}", duration)
+                return True
+            else:
+                self.log_test(test_name, False, f"Status: {response.status_code}", duration)
+                return False
                 
-                if response.status == 200:
-                    data = await response.json()
-                    self.log_test(test_name, True, f"Backend accessible: {data.get('message', 'OK')}", duration)
-                    return True
-                else:
-                    self.log_test(test_name, False, f"Status: {response.status}", duration)
-                    return False
-                    
         except Exception as e:
             duration = time.time() - start_time
             self.log_test(test_name, False, f"Exception: {str(e)}", duration)
@@ -71,31 +84,31 @@ class FocusedTikTokTester:
         start_time = time.time()
         
         try:
-            async with self.session.get(f"{BACKEND_URL}/voices/available") as response:
-                duration = time.time() - start_time
-                
-                if response.status == 200:
-                    data = await response.json()
-                    if "voices" in data and isinstance(data["voices"], list):
-                        voice_count = len(data["voices"])
-                        sample_voices = [(v["name"], v["voice_id"]) for v in data["voices"][:3]]
-                        
-                        # Check if we have the expected 19+ voices
-                        expected_min = 19
-                        if voice_count >= expected_min:
-                            self.log_test(test_name, True, f"✅ {voice_count} voices available (≥{expected_min}). Sample: {sample_voices}", duration)
-                            return True, data["voices"]
-                        else:
-                            self.log_test(test_name, False, f"Only {voice_count} voices (expected ≥{expected_min})", duration)
-                            return False, []
+            response = await with_retry(lambda: self.session.get("/voices/available"))
+            duration = time.time() - start_time
+            
+            if response.status_code == 200:
+                data = parse_json(response)
+                if "voices" in data and isinstance(data["voices"], list):
+                    voice_count = len(data["voices"])
+                    sample_voices = [(v["name"], v["voice_id"]) for v in data["voices"][:3]]
+                    
+                    # Check if we have the expected 19+ voices
+                    expected_min = 19
+                    if voice_count >= expected_min:
+                        self.log_test(test_name, True, f"✅ {voice_count} voices available (≥{expected_min}). Sample: {sample_voices}", duration)
+                        return True, data["voices"]
                     else:
-                        self.log_test(test_name, False, f"Invalid response format", duration)
+                        self.log_test(test_name, False, f"Only {voice_count} voices (expected ≥{expected_min})", duration)
                         return False, []
                 else:
-                    error_text = await response.text()
-                    self.log_test(test_name, False, f"Status: {response.status}, Error: {error_text}", duration)
+                    self.log_test(test_name, False, f"Invalid response format", duration)
                     return False, []
-                    
+            else:
+                error_text = response.text
+                self.log_test(test_name, False, f"Status: {response.status_code}, Error: {error_text}", duration)
+                return False, []
+                
         except Exception as e:
             duration = time.time() - start_time
             self.log_test(test_name, False, f"Exception: {str(e)}", duration)
@@ -112,28 +125,30 @@ class FocusedTikTokTester:
                 "duration": 30
             }
             
-            async with self.session.post(
-                f"{BACKEND_URL}/generate-script",
-                json=payload,
-                headers={"Content-Type": "application/json"}
-            ) as response:
-                duration = time.time() - start_time
-                
-                if response.status == 200:
-                    data = await response.json()
-                    script_length = len(data.get("script_text", ""))
-                    scene_count = len(data.get("scenes", []))
-                    self.log_test(test_name, True, f"✅ Script generated: {script_length} chars, {scene_count} scenes", duration)
-                    return True, data
+            response = await with_retry(
+                lambda: self.session.post(
+                    "/generate-script",
+                    json=payload,
+                    headers={"Content-Type": "application/json"}
+                )
+            )
+            duration = time.time() - start_time
+            
+            if response.status_code == 200:
+                data = parse_json(response)
+                script_length = len(data.get("script_text", ""))
+                scene_count = len(data.get("scenes", []))
+                self.log_test(test_name, True, f"✅ Script generated: {script_length} chars, {scene_count} scenes", duration)
+                return True, data
+            else:
+                error_text = response.text
+                # Check if it's an API key issue
+                if classify_response(response.status_code, error_text) == "AUTH":
+                    self.log_test(test_name, False, f"❌ CRITICAL: OpenAI API key is INVALID (401 Unauthorized)", duration)
                 else:
-                    error_text = await response.text()
-                    # Check if it's an API key issue
-                    if "401" in str(response.status) or "invalid_api_key" in error_text:
-                        self.log_test(test_name, False, f"❌ CRITICAL: OpenAI API key is INVALID (401 Unauthorized)", duration)
-                    else:
-                        self.log_test(test_name, False, f"Status: {response.status}, Error: {error_text[:200]}", duration)
-                    return False, None
-                    
+                    self.log_test(test_name, False, f"Status: {response.status_code}, Error: {error_text[:200]}", duration)
+                return False, None
+                
         except Exception as e:
             duration = time.time() - start_time
             self.log_test(test_name, False, f"Exception: {str(e)}", duration)
@@ -162,36 +177,40 @@ class FocusedTikTokTester:
             
             print(f"   Testing with voice: {voice_name} ({voice_id})")
             
-            async with self.session.post(
-                f"{BACKEND_URL}/create-complete-video",
-                json=payload,
-                headers={"Content-Type": "application/json"}
-            ) as response:
-                duration = time.time() - start_time
-                
-                if response.status == 200:
-                    data = await response.json()
-                    # Check if voice_id was properly used
-                    if "audio" in data and "voice_id" in data["audio"]:
-                        returned_voice_id = data["audio"]["voice_id"]
-                        if returned_voice_id == voice_id:
-                            self.log_test(test_name, True, f"✅ Voice ID correctly integrated: {voice_name} ({voice_id})", duration)
-                            return True
-                        else:
-                            self.log_test(test_name, False, f"Voice ID mismatch: sent {voice_id}, got {returned_voice_id}", duration)
-                            return False
+            # Only audio.voice_id is checked, so skip the multi-MB base64 payloads
+            response = await with_retry(
+                lambda: self.session.post(
+                    "/create-complete-video",
+                    params={"include": "metadata"},
+                    json=payload,
+                    headers={"Content-Type": "application/json"}
+                )
+            )
+            duration = time.time() - start_time
+            
+            if response.status_code == 200:
+                data = parse_json(response)
+                # Check if voice_id was properly used
+                if "audio" in data and "voice_id" in data["audio"]:
+                    returned_voice_id = data["audio"]["voice_id"]
+                    if returned_voice_id == voice_id:
+                        self.log_test(test_name, True, f"✅ Voice ID correctly integrated: {voice_name} ({voice_id})", duration)
+                        return True
                     else:
-                        self.log_test(test_name, False, f"Voice ID not found in response", duration)
+                        self.log_test(test_name, False, f"Voice ID mismatch: sent {voice_id}, got {returned_voice_id}", duration)
                         return False
                 else:
-                    error_text = await response.text()
-                    # Check if it's an API key issue blocking the test
-                    if "401" in str(response.status) or "invalid_api_key" in error_text:
-                        self.log_test(test_name, False, f"❌ BLOCKED: OpenAI API key invalid - cannot test voice_id integration", duration)
-                    else:
-                        self.log_test(test_name, False, f"Status: {response.status}, Error: {error_text[:200]}", duration)
+                    self.log_test(test_name, False, f"Voice ID not found in response", duration)
                     return False
-                    
+            else:
+                error_text = response.text
+                # Check if it's an API key issue blocking the test
+                if classify_response(response.status_code, error_text) == "AUTH":
+                    self.log_test(test_name, False, f"❌ BLOCKED: OpenAI API key invalid - cannot test voice_id integration", duration)
+                else:
+                    self.log_test(test_name, False, f"Status: {response.status_code}, Error: {error_text[:200]}", duration)
+                return False
+                
         except Exception as e:
             duration = time.time() - start_time
             self.log_test(test_name, False, f"Exception: {str(e)}", duration)
@@ -204,25 +223,28 @@ class FocusedTikTokTester:
         
         try:
             # Test with invalid script_id to trigger error handling
-            async with self.session.post(
-                f"{BACKEND_URL}/generate-voice?script_id=invalid-id&voice_id=test",
-                headers={"Content-Type": "application/json"}
-            ) as response:
-                duration = time.time() - start_time
-                
-                if response.status == 404:
-                    error_data = await response.json()
-                    if "detail" in error_data and "Script not found" in error_data["detail"]:
-                        self.log_test(test_name, True, f"✅ Proper error handling: {error_data['detail']}", duration)
-                        return True
-                    else:
-                        self.log_test(test_name, False, f"Unexpected error format: {error_data}", duration)
-                        return False
+            response = await with_retry(
+                lambda: self.session.post(
+                    "/generate-voice",
+                    params={"script_id": "invalid-id", "voice_id": "test"},
+                    headers={"Content-Type": "application/json"}
+                )
+            )
+            duration = time.time() - start_time
+            
+            if response.status_code == 404:
+                error_data = parse_json(response)
+                if "detail" in error_data and "Script not found" in error_data["detail"]:
+                    self.log_test(test_name, True, f"✅ Proper error handling: {error_data['detail']}", duration)
+                    return True
                 else:
-                    error_text = await response.text()
-                    self.log_test(test_name, False, f"Unexpected status: {response.status}, {error_text[:100]}", duration)
+                    self.log_test(test_name, False, f"Unexpected error format: {error_data}", duration)
                     return False
-                    
+            else:
+                error_text = response.text
+                self.log_test(test_name, False, f"Unexpected status: {response.status_code}, {error_text[:100]}", duration)
+                return False
+                
         except Exception as e:
             duration = time.time() - start_time
             self.log_test(test_name, False, f"Exception: {str(e)}", duration)
@@ -238,31 +260,29 @@ class FocusedTikTokTester:
         # Test sequence
         tests_results = {}
         
-        # 1. API Health
-        print(f"\n🧪 Testing: API Health")
-        tests_results["api_health"] = await self.test_api_health()
-        
-        # 2. ElevenLabs Integration
-        print(f"\n🧪 Testing: ElevenLabs Voices")
-        voices_success, voices = await self.test_elevenlabs_voices()
+        # 1-3, 5. Health, ElevenLabs, OpenAI and error handling don't depend on each other
+        print(f"\n🧪 Testing: API Health, ElevenLabs Voices, OpenAI Script Generation, Error Handling")
+        (
+            tests_results["api_health"],
+            (voices_success, voices),
+            (openai_success, script_data),
+            tests_results["error_handling"]
+        ) = await asyncio.gather(
+            self.test_api_health(),
+            self.test_elevenlabs_voices(),
+            self.test_openai_script_generation(),
+            self.test_error_handling_improvements()
+        )
         tests_results["elevenlabs_voices"] = voices_success
-        
-        # 3. OpenAI Integration
-        print(f"\n🧪 Testing: OpenAI Script Generation")
-        openai_success, script_data = await self.test_openai_script_generation()
         tests_results["openai_script"] = openai_success
         
-        # 4. Voice ID Integration (key fix being tested)
+        # 4. Voice ID Integration (key fix being tested) needs the voice list
         print(f"\n🧪 Testing: Voice ID Integration")
         tests_results["voice_id_integration"] = await self.test_voice_id_integration(voices)
         
-        # 5. Error Handling
-        print(f"\n🧪 Testing: Error Handling")
-        tests_results["error_handling"] = await self.test_error_handling_improvements()
-        
         # Summary
         print("\n" + "=" * 80)
-        print("🎯 FOCUSED TEST RESULTS:")
+        print(f"🎯 FOCUSED TEST RESULTS: {self._passed}/{len(self.test_results)} checks passed")
         
         working_components = []
         blocked_components = []
@@ -295,6 +315,11 @@ class FocusedTikTokTester:
             for component in blocked_components:
                 print(f"   {component}")
         
+        if self._auth_failures:
+            print("\n🔑 AUTHENTICATION FAILURES:")
+            for test_name, details in self._auth_failures:
+                print(f"   {test_name}: {details}")
+        
         # Determine overall status
         critical_working = tests_results["api_health"] and tests_results["elevenlabs_voices"]
         openai_blocked = not tests_results["openai_script"]
@@ -315,12 +340,12 @@ async def main():
         status, results = await tester.run_focused_tests()
         
         # Save results
-        with open("/app/focused_test_results.json", "w") as f:
-            json.dump({
+        with open("/app/focused_test_results.json", "wb") as f:
+            f.write(orjson.dumps({
                 "status": status,
                 "timestamp": datetime.now().isoformat(),
                 "detailed_results": results
-            }, f, indent=2)
+            }, option=orjson.OPT_INDENT_2))
         
         print(f"\n📄 Results saved to: /app/focused_test_results.json")
         return status == "success"
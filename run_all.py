@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Run every backend test script concurrently
+Each script runs in its own process with its own connection pool; the scripts sharing the
+.test_cache response cache run one after another so they never write the shelve file at once
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+
+# Lanes run concurrently; the scripts inside a lane run in order
+LANES = [
+    ["openai_validation_test.py", "pipeline_validation_test.py", "test_api.py"],  # share .test_cache
+    ["focused_backend_test.py"],
+    ["voice_id_test.py"],
+    ["backend_test.py"],
+]
+
+async def run_script(script, extra_args):
+    """Run one script, returning (script, exit code, duration, combined output)"""
+    start_time = time.time()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, script, *extra_args,
+        cwd=ROOT,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT
+    )
+    output, _ = await proc.communicate()
+    return script, proc.returncode, time.time() - start_time, output.decode(errors="replace")
+
+async def run_lane(lane, extra_args):
+    results = []
+    for script in lane:
+        result = await run_script(script, extra_args.get(script, []))
+        script, returncode, duration, output = result
+        # Print each script's output as one block so concurrent lanes don't interleave
+        sys.stdout.write(f"\n{'=' * 80}\n▶️  {script} ({duration:.2f}s, exit {returncode})\n{'=' * 80}\n{output}")
+        results.append(result)
+    return results
+
+async def main(no_cache=False):
+    print("🚀 Running all backend test scripts")
+    start_time = time.time()
+
+    # Only the scripts backed by the response cache understand --no-cache
+    extra_args = {script: ["--no-cache"] for script in LANES[0]} if no_cache else {}
+    lanes = await asyncio.gather(*(run_lane(lane, extra_args) for lane in LANES))
+    results = [result for lane in lanes for result in lane]
+
+    lines = ["", "=" * 80, f"📊 ALL SCRIPTS ({time.time() - start_time:.2f}s wall clock):"]
+    for script, returncode, duration, _ in results:
+        status = "✅ PASS" if returncode == 0 else "❌ FAIL"
+        lines.append(f"   {status}: {script} ({duration:.2f}s)")
+    sys.stdout.write("\n".join(lines) + "\n")
+
+    return all(returncode == 0 for _, returncode, _, _ in results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run every backend test script concurrently")
+    parser.add_argument("--no-cache", action="store_true", help="ignore responses cached by previous runs")
+    args = parser.parse_args()
+    success = asyncio.run(main(no_cache=args.no_cache))
+    exit(0 if success else 1)
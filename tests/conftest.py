@@ -0,0 +1,6 @@
+def pytest_addoption(parser):
+    parser.addoption(
+        "--no-response-cache",
+        action="store_true",
+        help="ignore API responses cached by previous runs"
+    )
@@ -0,0 +1,99 @@
+"""
+Pipeline tests against the deployed backend
+Covers what openai_validation_test.py and pipeline_validation_test.py check, but shares
+one HTTP/2 client, one response cache and one generated script across every test,
+so a CI run pays for GPT-4 and DALL-E once instead of once per script
+"""
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from api_test_helpers import ResponseCache, cached_request, parse_json, with_retry, VOICES_TTL
+from pipeline_validation_test import (
+    BACKEND_URL,
+    REQUIRED_SECTIONS,
+    assemble_video_step,
+    generate_script_and_images_step
+)
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+PAYLOAD = {
+    "prompt": "astuces productivité pour étudiants universitaires",
+    "duration": 30
+}
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def client():
+    async with httpx.AsyncClient(
+        base_url=BACKEND_URL,
+        http2=True,
+        timeout=httpx.Timeout(180.0),
+        limits=httpx.Limits(max_keepalive_connections=8, max_connections=16)
+    ) as c:
+        try:
+            await c.get("/", timeout=10.0)
+        except httpx.TransportError as e:
+            pytest.skip(f"Backend unreachable: {e}")
+        yield c
+
+@pytest.fixture(scope="session")
+def cache(request):
+    cache = ResponseCache(enabled=not request.config.getoption("--no-response-cache"))
+    yield cache
+    cache.close()
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def voices(client, cache):
+    response = await cached_request(client, cache, "GET", "/voices/available", ttl=VOICES_TTL)
+    assert response.status_code == 200, response.text
+    return parse_json(response)["voices"]
+
+@pytest.fixture(scope="session")
+def voice_id(voices):
+    return voices[0]["voice_id"]
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def generated(client, cache):
+    ok, result = await generate_script_and_images_step(client, cache, PAYLOAD)
+    assert ok, f"Script/image generation failed: {result.status_code} {result.text}"
+    return result
+
+@pytest.fixture(scope="session")
+def script(generated):
+    return generated["script"]
+
+@pytest.fixture(scope="session")
+def images(generated):
+    return generated
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def pipeline(client, script, images, voice_id):
+    image_ids = [img["id"] for img in images["images"]]
+    ok, response = await assemble_video_step(client, {**PAYLOAD, "voice_id": voice_id}, script["id"], image_ids)
+    assert ok, f"Pipeline failed: {response.status_code} {response.text}"
+    return parse_json(response)
+
+async def test_voices_available(voices):
+    assert len(voices) >= 19
+
+async def test_script_generation(script):
+    assert script["script_text"]
+    assert script["scenes"]
+
+async def test_image_generation(images):
+    assert images["total_generated"] > 0
+    assert images["images"][0]["image_base64_length"] > 0
+
+async def test_complete_pipeline(pipeline, script, voice_id):
+    assert not REQUIRED_SECTIONS - pipeline.keys()
+    assert pipeline["script"]["id"] == script["id"]
+    assert pipeline["audio"]["voice_id"] == voice_id
+    assert pipeline["video"]["video_base64_length"] > 0
+
+async def test_project_retrieval(client, pipeline):
+    project_id = pipeline["project_id"]
+    response = await with_retry(lambda: client.get(f"/project/{project_id}", params={"include": "metadata"}))
+    assert response.status_code == 200, response.text
+    assert parse_json(response)["project"]["id"] == project_id